@@ -18,11 +18,12 @@ species_list_path="species_list.txt"
 reference="wheat"
 top_x="10"
 cutoff="0.0001"
+merge_mode="lazy"   # lazy: rank hits from the S3 index files first, full: decode every JSON
 
 mkdir ./alignments/
 
 # Execute the Python script
-python ./python/merge_JSON_alignments.py $species_list_path $reference $top_x $cutoff
+python ./python/merge_JSON_alignments.py $species_list_path $reference $top_x $cutoff $merge_mode
 
 # Print completion timestamp
 date
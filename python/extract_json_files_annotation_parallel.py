@@ -125,12 +125,59 @@ def process_html_file(input_file, species_name, tsv_dict):
     os.makedirs(outdir, exist_ok=True)
     out_path = os.path.join(outdir, base + ".json")
 
+    # Serialize up front so the index can record where each alignment sits in the file
+    text = json.dumps(data, indent=2)
+
     try:
         with open(out_path, 'w', encoding='utf-8') as out:
-            json.dump(data, out, indent=2)
+            out.write(text)
         print(f"Wrote filtered JSON to: {out_path}")
     except Exception as e:
         print(f"ERROR: could not write JSON '{out_path}': {e}")
+        return
+
+    write_index_file(data, text, outdir, base)
+
+def write_index_file(data, text, outdir, base):
+    """
+    Writes a small sidecar index next to the cleaned JSON holding the query
+    header and only the light fields (target, eval, species) of every
+    alignment, plus the byte offset and length of that alignment in the full
+    file. merge_JSON_alignments.py reads these to pick the top hits and then
+    decodes just the surviving alignments.
+    """
+    if not isinstance(data, list) or len(data) == 0:
+        return
+
+    # json.dumps escapes non-ASCII by default, so character offsets are byte offsets.
+    # Alignments sit three levels deep (list > record > alignments), i.e. 6 spaces with indent=2.
+    entries = []
+    pos = 0
+    for record in data:
+        for aln in record.get("alignments", []):
+            snippet = json.dumps(aln, indent=2).replace("\n", "\n      ")
+            offset = text.find(snippet, pos)
+            if offset == -1:
+                print(f"ERROR: could not locate alignment '{aln.get('target')}' in '{base}.json'. Index not written.")
+                return
+            pos = offset + len(snippet)
+            entries.append({
+                "offset": offset,
+                "length": len(snippet),
+                "target": aln.get("target"),
+                "eval": aln.get("eval"),
+                "species": aln.get("species")
+            })
+
+    index_dir = os.path.join(outdir, "index")
+    os.makedirs(index_dir, exist_ok=True)
+    index_path = os.path.join(index_dir, base + ".json")
+
+    try:
+        with open(index_path, 'w', encoding='utf-8') as out:
+            json.dump({"query": data[0].get("query", {}), "alignments": entries}, out)
+    except Exception as e:
+        print(f"ERROR: could not write index '{index_path}': {e}")
 
 def main():
     parser = argparse.ArgumentParser(description="Process HTML files in a directory to extract and modify JSON data.")
@@ -121,13 +121,21 @@ def main():
         jobs.append(params)
 
     # --- 5) run them in parallel ---
+    failed = 0
     with concurrent.futures.ProcessPoolExecutor(max_workers=48) as executor:
         for fpath, success, err in executor.map(run_foldseek_job, jobs):
             status = "Done" if success else f"FAILED: {err}"
             print(f"{status} → {fpath}")
+            if not success:
+                failed += 1
 
     print(f"Finished at: {datetime.now()}")
 
+    # --- 6) exit non-zero so a partial search is not treated as complete ---
+    if failed:
+        print(f"Error: {failed} of {len(jobs)} foldseek jobs failed")
+        sys.exit(4)
+
 
 
 if __name__ == "__main__":
@@ -5,6 +5,7 @@ import os
 import json
 import re
 import csv
+import heapq
 from pathlib import Path
 from collections import defaultdict
 
@@ -18,6 +19,9 @@ REMOVE_EXT_PATTERN = re.compile(r'(\.cif\.gz|\.pdb\.gz|\.json\.gz)$', re.IGNOREC
 # Regex to extract UniProt ID from filename
 UNIPROT_PATTERN = re.compile(r'^AF-(.*?)-F1-model_v4', re.IGNORECASE)
 
+# Supported merge modes: 'full' decodes every JSON, 'lazy' ranks hits from the S3 index files first
+MERGE_MODES = ('full', 'lazy')
+
 # -------------------------------
 # Function Definitions
 # -------------------------------
@@ -120,6 +124,83 @@ def collect_uniprot_ids(reference_dir):
 
     return uniprot_ids
 
+def find_json_file(html_dir, uniprot_id):
+    """
+    Locates the cleaned JSON file written by S3 for a UniProt ID.
+
+    Parameters:
+        html_dir (str): The species HTML directory.
+        uniprot_id (str): The UniProt ID to look up.
+
+    Returns:
+        Path or None: Path to '<uniprot_id>.json' or '<uniprot_id>.pdb.json', or None if neither exists.
+    """
+    for name in (f"{uniprot_id}.json", f"{uniprot_id}.pdb.json"):
+        json_file_path = Path(html_dir) / 'JSON' / name
+        if json_file_path.is_file():
+            return json_file_path
+    return None
+
+def iter_species_json_files(uniprot_id, species_list, state):
+    """
+    Yields the JSON file of every species that has one for the UniProt ID, in species list order.
+
+    Parameters:
+        uniprot_id (str): The UniProt ID to process.
+        species_list (list of dict): List of species information.
+        state (dict): 'species_found' is incremented for every file yielded.
+    """
+    for species in species_list:
+        species_name = species['Species']
+        json_file_path = find_json_file(species['HTML'], uniprot_id)
+
+        if json_file_path is None:
+            print(f"WARNING: JSON file '{uniprot_id}.json' or '{uniprot_id}.pdb.json' were not found for species '{species_name}'. Skipping.")
+            continue
+
+        state['species_found'] += 1
+        yield json_file_path
+
+def load_species_json(json_file_path):
+    """
+    Decodes a cleaned JSON file and returns its query and alignments.
+
+    Parameters:
+        json_file_path (Path): Path to the cleaned JSON file.
+
+    Returns:
+        tuple or None: (query, list of alignments), or None if the file is unreadable, empty or not a list.
+    """
+    try:
+        with open(json_file_path, 'r', encoding='utf-8') as jf:
+            json_data = json.load(jf)
+    except json.JSONDecodeError as jde:
+        print(f"ERROR: JSON decoding failed for file '{json_file_path}': {jde}")
+        return None
+    except Exception as e:
+        print(f"ERROR: Failed to process JSON file '{json_file_path}': {e}")
+        return None
+
+    if not isinstance(json_data, list) or len(json_data) == 0:
+        print(f"WARNING: JSON file '{json_file_path}' is empty or not a list. Skipping.")
+        return None
+
+    # Assuming the first entry contains the 'query' information
+    query = json_data[0].get('query', {})
+
+    # Extract 'alignments' from the JSON
+    alignments = []
+    for record in json_data:
+        record_alignments = record.get('alignments', [])
+        if isinstance(record_alignments, list):
+            alignments.extend(record_alignments)
+    return query, alignments
+
+def passes_cutoff(aln, cutoff_value):
+    """Returns True if the alignment has a numeric 'eval' <= cutoff_value."""
+    eval_value = aln.get('eval', None)
+    return isinstance(eval_value, (int, float)) and eval_value <= cutoff_value
+
 def merge_alignments_for_uniprot(uniprot_id, species_list, top_x, cutoff_value):
     """
     Merges alignments from multiple JSON files corresponding to a UniProt ID across different species.
@@ -135,48 +216,19 @@ def merge_alignments_for_uniprot(uniprot_id, species_list, top_x, cutoff_value):
     """
     merged_alignments = []
     query_info = None
-    species_found = 0  # Counter to check if any species has the JSON file
+    state = {'species_found': 0}  # Counter to check if any species has the JSON file
 
-    for species in species_list:
-        species_name = species['Species']
-        html_dir = species['HTML']
-        json_file_path = Path(html_dir) / 'JSON' / f"{uniprot_id}.json"
-
-        if not json_file_path.is_file():
-            json_file_path_save = json_file_path
-            json_file_path = Path(html_dir) / 'JSON' / f"{uniprot_id}.pdb.json"
-
-        if not json_file_path.is_file():
-            print(f"WARNING: JSON file '{json_file_path_save }' or  '{json_file_path}' were not found for species '{species_name}'. Skipping.")
+    for json_file_path in iter_species_json_files(uniprot_id, species_list, state):
+        loaded = load_species_json(json_file_path)
+        if loaded is None:
             continue
 
-        species_found += 1
-
-        try:
-            with open(json_file_path, 'r', encoding='utf-8') as jf:
-                json_data = json.load(jf)
+        query, alignments = loaded
+        if query_info is None:
+            query_info = query
+        merged_alignments.extend(alignments)
 
-                if not isinstance(json_data, list) or len(json_data) == 0:
-                    print(f"WARNING: JSON file '{json_file_path}' is empty or not a list. Skipping.")
-                    continue
-
-                # Assuming the first entry contains the 'query' information
-                if query_info is None:
-                    query_info = json_data[0].get('query', {})
-
-                # Extract 'alignments' from the JSON
-                for record in json_data:
-                    alignments = record.get('alignments', [])
-                    if isinstance(alignments, list):
-                        merged_alignments.extend(alignments)
-        except json.JSONDecodeError as jde:
-            print(f"ERROR: JSON decoding failed for file '{json_file_path}': {jde}")
-            continue
-        except Exception as e:
-            print(f"ERROR: Failed to process JSON file '{json_file_path}': {e}")
-            continue
-
-    if species_found == 0:
+    if state['species_found'] == 0:
         print(f"WARNING: No JSON files found for UniProt ID '{uniprot_id}'. Skipping.")
         return None
 
@@ -188,10 +240,7 @@ def merge_alignments_for_uniprot(uniprot_id, species_list, top_x, cutoff_value):
         print(f"WARNING: No 'alignments' found for UniProt ID '{uniprot_id}'.")
 
     # Filter alignments by 'eval' <= cutoff_value
-    filtered_alignments = [
-        aln for aln in merged_alignments
-        if isinstance(aln.get('eval', None), (int, float)) and aln['eval'] <= cutoff_value
-    ]
+    filtered_alignments = [aln for aln in merged_alignments if passes_cutoff(aln, cutoff_value)]
 
     if not filtered_alignments:
         print(f"WARNING: No alignments passed the 'eval' cutoff for UniProt ID '{uniprot_id}'.")
@@ -213,6 +262,158 @@ def merge_alignments_for_uniprot(uniprot_id, species_list, top_x, cutoff_value):
 
     return merged_json
 
+def load_index(json_file_path):
+    """
+    Reads the light-weight index written by S3 next to a cleaned JSON file.
+
+    Parameters:
+        json_file_path (Path): Path to the cleaned JSON file.
+
+    Returns:
+        dict or None: The index with 'query' and 'alignments' entries ('offset', 'length', 'target',
+        'eval', 'species'), or None if the index is missing, older than the JSON file or unreadable.
+    """
+    index_path = json_file_path.parent / 'index' / json_file_path.name
+    try:
+        if index_path.stat().st_mtime < json_file_path.stat().st_mtime:
+            return None
+        with open(index_path, 'r', encoding='utf-8') as inf:
+            index = json.load(inf)
+    except (OSError, ValueError):
+        return None
+
+    # Indexes written before offsets were recorded are treated as missing
+    if not isinstance(index, dict) or 'query' not in index or not isinstance(index.get('alignments'), list):
+        return None
+    if any('offset' not in entry or 'length' not in entry for entry in index['alignments']):
+        return None
+    return index
+
+def read_alignment(json_file_path, offset, length):
+    """
+    Decodes a single alignment from a cleaned JSON file using the byte range recorded in its index.
+
+    Returns:
+        dict or None: The alignment, or None if the range does not hold a JSON object.
+    """
+    try:
+        with open(json_file_path, 'rb') as jf:
+            jf.seek(offset)
+            alignment = json.loads(jf.read(length))
+    except (OSError, ValueError):
+        return None
+    return alignment if isinstance(alignment, dict) else None
+
+def iter_candidates(uniprot_id, species_list, cutoff_value, state, untrusted):
+    """
+    Yields the alignments passing the 'eval' cutoff for a UniProt ID, reading only the index files where available.
+
+    Each candidate is a tuple (eval, json_file_path, entry, payload). 'entry' is the index entry and
+    'payload' is None when the candidate came from an index file; when the species had to be fully
+    decoded 'entry' is None and 'payload' holds the full alignment.
+
+    Parameters:
+        uniprot_id (str): The UniProt ID to process.
+        species_list (list of dict): List of species information.
+        cutoff_value (float): Maximum allowable 'eval' value for alignments to be included.
+        state (dict): Updated in place with 'species_found', 'alignments_found' and, from the first readable species, 'query'.
+        untrusted (set): JSON files whose index must be ignored.
+    """
+    for json_file_path in iter_species_json_files(uniprot_id, species_list, state):
+        index = load_index(json_file_path) if json_file_path not in untrusted else None
+        if index is not None:
+            if 'query' not in state:
+                state['query'] = index['query']
+            state['alignments_found'] += len(index['alignments'])
+            for entry in index['alignments']:
+                if passes_cutoff(entry, cutoff_value):
+                    yield (entry['eval'], json_file_path, entry, None)
+            continue
+
+        # No usable index for this species, fall back to decoding the full file
+        loaded = load_species_json(json_file_path)
+        if loaded is None:
+            continue
+
+        query, alignments = loaded
+        if 'query' not in state:
+            state['query'] = query
+        state['alignments_found'] += len(alignments)
+        for aln in alignments:
+            if passes_cutoff(aln, cutoff_value):
+                yield (aln['eval'], json_file_path, None, aln)
+
+def merge_alignments_for_uniprot_lazy(uniprot_id, species_list, top_x, cutoff_value):
+    """
+    Same result as merge_alignments_for_uniprot, but selects the top X alignments from the
+    light-weight S3 index files with a bounded heap and only then decodes the survivors from
+    their recorded byte ranges, so work scales with top_x rather than with the number of species.
+
+    If a survivor cannot be read back from its byte range, that species' index is ignored and
+    the selection is repeated with its JSON file fully decoded.
+
+    Parameters:
+        uniprot_id (str): The UniProt ID to process.
+        species_list (list of dict): List of species information.
+        top_x (int): Number of top alignments to keep.
+        cutoff_value (float): Maximum allowable 'eval' value for alignments to be included.
+
+    Returns:
+        dict or None: Merged JSON data with 'query' and 'alignments', or None if no data found.
+    """
+    untrusted = set()
+
+    while True:
+        state = {'species_found': 0, 'alignments_found': 0}
+
+        # nsmallest keeps at most top_x candidates and is stable, matching sorted(...)[:top_x]
+        top_candidates = heapq.nsmallest(
+            top_x,
+            iter_candidates(uniprot_id, species_list, cutoff_value, state, untrusted),
+            key=lambda x: x[0]
+        )
+
+        # Decode only the surviving alignments
+        top_alignments = []
+        mismatched = set()
+        for _eval, json_file_path, entry, payload in top_candidates:
+            if payload is None:
+                payload = read_alignment(json_file_path, entry['offset'], entry['length'])
+                if payload is None or payload.get('target') != entry.get('target'):
+                    mismatched.add(json_file_path)
+                    continue
+            top_alignments.append(payload)
+
+        if not mismatched:
+            break
+
+        for json_file_path in sorted(mismatched):
+            print(f"WARNING: Index for '{json_file_path}' does not match the JSON file. Decoding it in full; re-run S3 for this species.")
+        untrusted |= mismatched
+
+    if state['species_found'] == 0:
+        print(f"WARNING: No JSON files found for UniProt ID '{uniprot_id}'. Skipping.")
+        return None
+
+    query_info = state.get('query')
+    if not query_info:
+        print(f"WARNING: No 'query' information found for UniProt ID '{uniprot_id}'. Skipping.")
+        return None
+
+    if state['alignments_found'] == 0:
+        print(f"WARNING: No 'alignments' found for UniProt ID '{uniprot_id}'.")
+
+    if not top_alignments:
+        print(f"WARNING: No alignments passed the 'eval' cutoff for UniProt ID '{uniprot_id}'.")
+        return None
+
+    merged_json = {
+        'query': query_info,
+        'alignments': top_alignments
+    }
+
+    return merged_json
+
 def save_master_json(uniprot_id, merged_data, reference):
     """
     Saves the merged JSON data to the designated output directory.
@@ -243,7 +444,7 @@ def save_master_json(uniprot_id, merged_data, reference):
 def main():
     # Check if the correct number of arguments is provided
     if len(sys.argv) < 5:
-        print("Usage: python merge_alignments.py <species_list.txt> <REFERENCE> <top_x> <cutoff_value>")
+        print("Usage: python merge_alignments.py <species_list.txt> <REFERENCE> <top_x> <cutoff_value> [full|lazy]")
         sys.exit(1)
 
     # Parse command-line arguments
@@ -257,7 +458,7 @@ def main():
             raise ValueError("The 'top_x' argument must be a positive integer.")
     except ValueError as ve:
         print(f"ERROR: {ve}")
-        print("Usage: python merge_alignments.py <species_list.txt> <REFERENCE> <top_x> <cutoff_value>")
+        print("Usage: python merge_alignments.py <species_list.txt> <REFERENCE> <top_x> <cutoff_value> [full|lazy]")
         sys.exit(1)
 
     # Convert 'cutoff_value' to float with error handling
@@ -267,8 +468,16 @@ def main():
             raise ValueError("The 'cutoff_value' argument must be a non-negative float.")
     except ValueError as ve:
         print(f"ERROR: {ve}")
-        print("Usage: python merge_alignments.py <species_list.txt> <REFERENCE> <top_x> <cutoff_value>")
+        print("Usage: python merge_alignments.py <species_list.txt> <REFERENCE> <top_x> <cutoff_value> [full|lazy]")
+        sys.exit(1)
+
+    # Optional merge mode, defaults to the lazy index-based merge
+    merge_mode = sys.argv[5].lower() if len(sys.argv) > 5 else 'lazy'
+    if merge_mode not in MERGE_MODES:
+        print(f"ERROR: Unknown merge mode '{merge_mode}'. Expected one of {', '.join(MERGE_MODES)}.")
+        print("Usage: python merge_alignments.py <species_list.txt> <REFERENCE> <top_x> <cutoff_value> [full|lazy]")
         sys.exit(1)
+    merge_function = merge_alignments_for_uniprot_lazy if merge_mode == 'lazy' else merge_alignments_for_uniprot
 
     print(f"INFO: Reading species list from '{species_list_path}'.")
     species_list = read_species_list(species_list_path)
@@ -286,7 +495,7 @@ def main():
     # Process each UniProt ID
     for uniprot_id in sorted(uniprot_ids):
         print(f"\nINFO: Processing UniProt ID '{uniprot_id}'.")
-        merged_data = merge_alignments_for_uniprot(uniprot_id, species_list, top_x, cutoff_value)
+        merged_data = merge_function(uniprot_id, species_list, top_x, cutoff_value)
         if merged_data:
             save_master_json(uniprot_id, merged_data, reference)
         else:
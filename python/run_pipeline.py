@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+"""
+Runs the S1-S5 CrossFoldDB workflow from a single entry point.
+
+The stages are modelled as a dependency graph of tasks:
+
+    S1_<species>                 foldseek createdb for every species
+    S2_<reference>_<species>     FoldSeek search of the reference against a species  (needs S1_<species>)
+    S3_<reference>_<species>     HTML -> JSON extraction for a species                (needs S2_<reference>_<species>)
+    S4_<reference>               merge of the per-species JSON files                  (needs every S3_<reference>_*)
+    S5_<reference>               reference annotation files                          (no dependencies)
+
+Each task starts as soon as its own inputs are complete, so S3 for one species overlaps
+with S2 for another. Tasks either run locally with bounded concurrency or are submitted
+to Slurm with afterok dependencies. A '<task>.done' marker is written to the state
+directory when a task succeeds. It records a run id and a fingerprint of the command and
+of the run ids of its dependencies, so on the next run a task is skipped only if its
+command is unchanged and none of its inputs were re-run since. An interrupted run
+resumes where it stopped.
+"""
+import sys
+import os
+import csv
+import json
+import uuid
+import shlex
+import hashlib
+import argparse
+import subprocess
+import concurrent.futures
+from datetime import datetime
+
+STATE_DIR = "./log/pipeline"
+LOG_DIR = "./log"
+
+def read_species_list(species_list_path):
+    """
+    Reads the species list TSV file and returns one dict per species.
+    Accepts either a 'Structure' or a 'CIF' column for the structure directory.
+    """
+    species_list = []
+    with open(species_list_path, mode='r', encoding='utf-8') as file:
+        reader = csv.DictReader(file, delimiter='\t')
+        for row in reader:
+            name = (row.get('Species') or '').strip()
+            if not name:
+                continue
+            species_list.append({
+                'Species': name,
+                'HTML': (row.get('HTML') or '').strip(),
+                'DB': (row.get('DB') or '').strip(),
+                'Structure': (row.get('Structure') or row.get('CIF') or '').strip(),
+                'Annotation': (row.get('Annotation') or '').strip()
+            })
+    return species_list
+
+def build_tasks(species_list_path, species_list, reference, top_x, cutoff, merge_mode, species_label):
+    """
+    Builds the task graph for one reference.
+
+    Returns:
+        dict: task id -> {'cmd': list of str, 'deps': list of task ids, 'dirs': list of directories to create}
+    """
+    python = sys.executable or "python"
+    home_path = os.path.join(os.getcwd(), "")
+    tasks = {}
+    s3_ids = []
+
+    for species in species_list:
+        name = species['Species']
+        s1 = f"S1_{name}"
+        s2 = f"S2_{reference}_{name}"
+        s3 = f"S3_{reference}_{name}"
+
+        tasks[s1] = {
+            'cmd': ["foldseek", "createdb", species['Structure'], species['DB']],
+            'deps': [],
+            'dirs': []
+        }
+        tasks[s2] = {
+            'cmd': [python, "./python/foldseek_search_parallel.py",
+                    species_list_path, name, reference, home_path, "forward"],
+            'deps': [s1],
+            'dirs': [f"./html/{name}", "./tmp"]
+        }
+        tasks[s3] = {
+            'cmd': [python, "./python/extract_json_files_annotation_parallel.py",
+                    f"./html/{name}", name, species['Annotation']],
+            'deps': [s2],
+            'dirs': []
+        }
+        s3_ids.append(s3)
+
+    tasks[f"S4_{reference}"] = {
+        'cmd': [python, "./python/merge_JSON_alignments.py",
+                species_list_path, reference, str(top_x), str(cutoff), merge_mode],
+        'deps': s3_ids,
+        'dirs': ["./alignments"]
+    }
+
+    base_dir = f"./metadata/{reference}_json"
+    tasks[f"S5_{reference}"] = {
+        'cmd': [python, "./python/create_reference_annotation_files.py",
+                f"./annotation/{reference}.tsv", f"{base_dir}/unitprot/", f"{base_dir}/alias/", species_label],
+        'deps': [],
+        'dirs': [f"{base_dir}/unitprot", f"{base_dir}/alias"]
+    }
+
+    return tasks
+
+def marker_path(state_dir, task_id, suffix):
+    return os.path.join(state_dir, f"{task_id}.{suffix}")
+
+def read_marker(state_dir, task_id, suffix):
+    """Returns the JSON content of a state marker, or None if it is missing or unreadable."""
+    try:
+        with open(marker_path(state_dir, task_id, suffix), 'r', encoding='utf-8') as inf:
+            marker = json.load(inf)
+    except (OSError, ValueError):
+        return None
+    return marker if isinstance(marker, dict) else None
+
+def fingerprint(task, dep_run_ids):
+    """Hashes a task's command together with the run ids of its dependencies."""
+    payload = json.dumps({'cmd': task['cmd'], 'deps': dep_run_ids}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def done_marker_json(plan_entry):
+    return json.dumps({'run_id': plan_entry['run_id'], 'fingerprint': plan_entry['fingerprint']})
+
+def plan_tasks(tasks, selected, state_dir):
+    """
+    Decides which tasks have to run. 'tasks' must list dependencies before their dependents.
+
+    A task is up to date if its '.done' marker holds the fingerprint of its current command
+    and of the run ids of its dependencies. A task that has to run gets a fresh run id, which
+    changes the fingerprint of every dependent, so they are re-run as well. Tasks outside
+    'selected' never run and keep the run id of their existing marker.
+
+    Returns:
+        dict: task id -> {'run': bool, 'run_id': str or None, 'fingerprint': str}
+    """
+    plan = {}
+    for task_id, task in tasks.items():
+        dep_run_ids = [[dep, plan[dep]['run_id']] for dep in task['deps'] if dep in plan]
+        fp = fingerprint(task, dep_run_ids)
+        marker = read_marker(state_dir, task_id, "done")
+        up_to_date = marker is not None and marker.get('fingerprint') == fp
+
+        if up_to_date or task_id not in selected:
+            plan[task_id] = {'run': False, 'run_id': marker.get('run_id') if marker else None, 'fingerprint': fp}
+        else:
+            plan[task_id] = {'run': True, 'run_id': uuid.uuid4().hex, 'fingerprint': fp}
+    return plan
+
+def run_task(task_id, task, plan_entry, state_dir):
+    """Runs one task locally, writing its output to ./log/<task>.log."""
+    for directory in task['dirs']:
+        os.makedirs(directory, exist_ok=True)
+
+    # Drop the old marker first so an interrupted re-run is never taken as done
+    done_file = marker_path(state_dir, task_id, "done")
+    if os.path.isfile(done_file):
+        os.remove(done_file)
+
+    log_file = os.path.join(LOG_DIR, f"{task_id}.log")
+    print(f"Running: {task_id} → {' '.join(task['cmd'])}")
+    try:
+        with open(log_file, 'w', encoding='utf-8') as log:
+            subprocess.run(task['cmd'], stdout=log, stderr=subprocess.STDOUT, check=True)
+    except (subprocess.CalledProcessError, OSError) as e:
+        return (task_id, False, str(e))
+
+    with open(done_file, 'w', encoding='utf-8') as out:
+        out.write(done_marker_json(plan_entry) + "\n")
+    return (task_id, True, "")
+
+def run_local(tasks, plan, state_dir, max_jobs):
+    """
+    Runs the planned tasks locally, starting every task as soon as its dependencies finished.
+    Tasks depending on a failed task are skipped.
+
+    Returns:
+        bool: True if every task completed.
+    """
+    done = {task_id for task_id in tasks if not plan[task_id]['run']}
+    failed = set()
+    pending = [task_id for task_id in tasks if plan[task_id]['run']]
+    running = {}
+
+    for task_id in tasks:
+        if task_id in done:
+            print(f"Skipping (up to date or not selected): {task_id}")
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_jobs) as executor:
+        while pending or running:
+            # Drop tasks that can no longer run because an upstream task failed
+            for task_id in list(pending):
+                if any(dep in failed for dep in tasks[task_id]['deps']):
+                    print(f"SKIPPED: {task_id} (upstream failure)")
+                    pending.remove(task_id)
+                    failed.add(task_id)
+
+            # Start every ready task while there is room
+            for task_id in list(pending):
+                if len(running) >= max_jobs:
+                    break
+                if all(dep in done for dep in tasks[task_id]['deps']):
+                    pending.remove(task_id)
+                    future = executor.submit(run_task, task_id, tasks[task_id], plan[task_id], state_dir)
+                    running[future] = task_id
+
+            if not running:
+                break
+
+            finished, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in finished:
+                running.pop(future)
+                task_id, success, err = future.result()
+                if success:
+                    done.add(task_id)
+                    print(f"Done → {task_id}")
+                else:
+                    failed.add(task_id)
+                    print(f"FAILED: {task_id}: {err}")
+
+    return not failed
+
+def slurm_job_active(job_id):
+    """Returns True if the Slurm job is still pending or running."""
+    try:
+        result = subprocess.run(["squeue", "-h", "-j", job_id], capture_output=True, text=True)
+    except OSError:
+        return False
+    return result.returncode == 0 and bool(result.stdout.strip())
+
+def reuse_queued_jobs(tasks, plan, state_dir):
+    """
+    Keeps jobs queued by an earlier submission when they would run exactly the planned work.
+
+    A queued job is reused only if its recorded fingerprint matches the plan, i.e. its command
+    is unchanged and none of its dependencies is being resubmitted. The job's run id is then
+    taken over so its dependents can be reused too. Any other job still queued is cancelled.
+    Queued jobs of tasks that are not run in this invocation (e.g. left out by --only) are
+    kept as they are and waited on by their dependents.
+
+    Returns:
+        dict: task id -> reused Slurm job id
+    """
+    job_ids = {}
+    for task_id, task in tasks.items():
+        submitted = read_marker(state_dir, task_id, "submitted")
+        if not submitted or not slurm_job_active(str(submitted.get('job_id', ''))):
+            continue
+
+        if not plan[task_id]['run']:
+            job_id = str(submitted['job_id'])
+            print(f"Waiting on queued job {job_id}: {task_id}")
+            plan[task_id]['run_id'] = submitted.get('run_id')
+            job_ids[task_id] = job_id
+            continue
+
+        # Dependencies may have taken over an older run id, so recompute the fingerprint first
+        dep_run_ids = [[dep, plan[dep]['run_id']] for dep in task['deps'] if dep in plan]
+        plan[task_id]['fingerprint'] = fingerprint(task, dep_run_ids)
+
+        job_id = str(submitted['job_id'])
+        if submitted.get('fingerprint') == plan[task_id]['fingerprint']:
+            print(f"Reusing queued job {job_id}: {task_id}")
+            plan[task_id]['run_id'] = submitted.get('run_id')
+            job_ids[task_id] = job_id
+        else:
+            print(f"Cancelling outdated job {job_id}: {task_id}")
+            subprocess.run(["scancel", job_id])
+    return job_ids
+
+def unmet_dependencies(tasks, plan, state_dir, job_ids):
+    """
+    Lists dependencies of planned tasks that will never complete in this invocation: they are
+    not run, have no '.done' marker and no queued job. This happens when --only leaves out a
+    stage that has not finished yet.
+
+    Returns:
+        list of (task id, dependency task id)
+    """
+    unmet = []
+    for task_id, task in tasks.items():
+        if not plan[task_id]['run']:
+            continue
+        for dep in task['deps']:
+            if plan[dep]['run'] or dep in job_ids:
+                continue
+            if not os.path.isfile(marker_path(state_dir, dep, "done")):
+                unmet.append((task_id, dep))
+    return unmet
+
+def report_unmet_dependencies(unmet):
+    """Prints the unmet dependencies and returns True if there were any."""
+    for task_id, dep in unmet:
+        print(f"ERROR: {task_id} depends on {dep}, which is neither done nor queued. Include its stage or run it first.")
+    return bool(unmet)
+
+def submit_slurm(tasks, plan, state_dir, sbatch_args):
+    """
+    Submits the planned tasks to Slurm, chaining tasks with afterok dependencies.
+
+    Returns:
+        bool: True if every job was submitted.
+    """
+    job_ids = reuse_queued_jobs(tasks, plan, state_dir)
+    if report_unmet_dependencies(unmet_dependencies(tasks, plan, state_dir, job_ids)):
+        return False
+
+    for task_id, task in tasks.items():
+        if not plan[task_id]['run']:
+            print(f"Skipping (up to date or not selected): {task_id}")
+            continue
+        if task_id in job_ids:
+            continue
+
+        # Recompute with the final run ids of the dependencies
+        dep_run_ids = [[dep, plan[dep]['run_id']] for dep in task['deps'] if dep in plan]
+        plan[task_id]['fingerprint'] = fingerprint(task, dep_run_ids)
+
+        done_file = marker_path(state_dir, task_id, "done")
+        if os.path.isfile(done_file):
+            os.remove(done_file)
+
+        wrap = " && ".join(
+            [f"mkdir -p {shlex.quote(d)}" for d in task['dirs']]
+            + [" ".join(shlex.quote(part) for part in task['cmd']),
+               f"printf '%s\\n' {shlex.quote(done_marker_json(plan[task_id]))} > {shlex.quote(done_file)}"]
+        )
+        cmd = ["sbatch", "--parsable", f"--job-name={task_id}",
+               "-o", os.path.join(LOG_DIR, f"{task_id}.%j.out")] + sbatch_args
+        dep_ids = [job_ids[dep] for dep in task['deps'] if dep in job_ids]
+        if dep_ids:
+            cmd.append("--dependency=afterok:" + ":".join(dep_ids))
+        cmd += ["--wrap", wrap]
+
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        except (subprocess.CalledProcessError, OSError) as e:
+            print(f"ERROR: sbatch failed for {task_id}: {e}")
+            return False
+
+        job_id = result.stdout.strip().split(";")[0]
+        job_ids[task_id] = job_id
+        with open(marker_path(state_dir, task_id, "submitted"), 'w', encoding='utf-8') as out:
+            json.dump({'job_id': job_id, 'run_id': plan[task_id]['run_id'],
+                       'fingerprint': plan[task_id]['fingerprint']}, out)
+        print(f"Submitted job {job_id}: {task_id}")
+
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the CrossFoldDB S1-S5 workflow as a dependency graph.")
+    parser.add_argument("reference", help="Name of the reference species (as in the species list).")
+    parser.add_argument("--species-list", default="species_list.txt", help="Path to the species list TSV file.")
+    parser.add_argument("--top-x", type=int, default=10, help="Number of top alignments kept by S4.")
+    parser.add_argument("--cutoff", type=float, default=0.0001, help="Maximum e-value kept by S4.")
+    parser.add_argument("--merge-mode", choices=["full", "lazy"], default="lazy", help="Merge mode passed to S4.")
+    parser.add_argument("--species-label", default=None, help="Species name written by S5 (defaults to the reference).")
+    parser.add_argument("--executor", choices=["local", "slurm"], default="local", help="Run locally or submit to Slurm.")
+    parser.add_argument("--max-jobs", type=int, default=2, help="Maximum number of tasks running at once (local).")
+    parser.add_argument("--sbatch-args", default="", help="Extra arguments passed to every sbatch call, e.g. \"--account=x --mem=200GB\".")
+    parser.add_argument("--state-dir", default=STATE_DIR, help="Directory holding the task completion markers.")
+    parser.add_argument("--only", nargs="*", default=None, help="Only run these stages, e.g. --only S2 S3.")
+    parser.add_argument("--dry-run", action="store_true", help="Print the task graph and exit.")
+
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.species_list):
+        print(f"ERROR: Species list '{args.species_list}' does not exist.")
+        sys.exit(1)
+    if args.max_jobs <= 0:
+        print("ERROR: --max-jobs must be a positive integer.")
+        sys.exit(1)
+
+    species_list = read_species_list(args.species_list)
+    if args.reference not in {species['Species'] for species in species_list}:
+        print(f"ERROR: reference species '{args.reference}' not found in '{args.species_list}'.")
+        sys.exit(1)
+
+    tasks = build_tasks(args.species_list, species_list, args.reference, args.top_x, args.cutoff,
+                        args.merge_mode, args.species_label or args.reference)
+
+    # Restrict to the requested stages; the other stages are neither run nor waited for
+    selected = set(tasks)
+    if args.only:
+        stages = {stage.upper() for stage in args.only}
+        selected = {task_id for task_id in tasks if task_id.split("_")[0] in stages}
+
+    plan = plan_tasks(tasks, selected, args.state_dir)
+
+    if args.dry_run:
+        for task_id, task in tasks.items():
+            if task_id not in selected:
+                continue
+            status = "todo" if plan[task_id]['run'] else "done"
+            deps = ", ".join(task['deps']) or "-"
+            print(f"[{status}] {task_id} (after: {deps})\n    {' '.join(task['cmd'])}")
+        return
+
+    os.makedirs(args.state_dir, exist_ok=True)
+    os.makedirs(LOG_DIR, exist_ok=True)
+
+    print(f"Started at: {datetime.now()}")
+    if args.executor == "slurm":
+        ok = submit_slurm(tasks, plan, args.state_dir, shlex.split(args.sbatch_args))
+    elif report_unmet_dependencies(unmet_dependencies(tasks, plan, args.state_dir, {})):
+        ok = False
+    else:
+        ok = run_local(tasks, plan, args.state_dir, args.max_jobs)
+    print(f"Finished at: {datetime.now()}")
+
+    if not ok:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()